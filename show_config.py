@@ -1,54 +1,111 @@
 # show_config.py
 
 import numpy as np
-import numpy.fft as fft
-import csv
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 import sys
+import os
 from matplotlib import pyplot as plt
-from matplotlib.patches import Rectangle
+from matplotlib.patches import Rectangle, FancyArrow
+from matplotlib.collections import PatchCollection
 import math
+import functools
+
+def abs2_db(z):
+    # 20*log10(|z|) computed from |z|^2, skipping the sqrt
+    return 10*np.log10(z.real*z.real + z.imag*z.imag)
+
+@functools.lru_cache(maxsize=None)
+def next_fast_len(n):
+    # smallest 5-smooth number >= n, these are the fast sizes for numpy's fft
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+def readonly(arr):
+    # cached arrays are shared by every caller, so they must not be modified in place
+    arr = np.asarray(arr)
+    arr.flags.writeable = False
+    return arr
+
+@functools.lru_cache(maxsize=32)
+def read_impulse(fname, fmt, mtime):
+    # mtime is only part of the cache key, so that a file is read again after it has been modified
+    values = []
+    if fmt == "text":
+        values = np.loadtxt(fname, delimiter=',', usecols=0, ndmin=1)
+    elif fmt == "FLOAT64LE":
+        values = np.fromfile(fname, dtype=float)
+    elif fmt == "FLOAT32LE":
+        values = np.fromfile(fname, dtype=np.float32)
+    elif fmt == "S16LE":
+        values = np.fromfile(fname, dtype=np.int16)/(2**15-1)
+    elif fmt == "S24LE":
+        # 24 bits in the lower three bytes of each 4-byte word, the top byte is padding
+        values = ((np.fromfile(fname, dtype='<i4') << 8) >> 8)/(2**23-1)
+    elif fmt == "S24LE3":
+        # pack the three bytes into the top of a 4-byte word, then shift down to sign extend
+        raw = np.fromfile(fname, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        values = (padded.view('<i4')[:, 0] >> 8)/(2**23-1)
+    elif fmt == "S32LE":
+        values = np.fromfile(fname, dtype=np.int32)/(2**31-1)
+    return readonly(values)
+
+def impulse_gain_and_phase(impulse, fs):
+    impulselen = len(impulse)
+    npoints = impulselen
+    if npoints < 300:
+        npoints = 300
+    nfft = next_fast_len(npoints*2)
+    f = np.fft.rfftfreq(nfft, 1.0/fs)[0:nfft//2]
+    if impulselen <= 8:
+        # only a few taps, evaluate the transfer function directly instead of padding for an fft
+        theta = 2*np.pi*f/fs
+        zi = np.cos(theta) - 1j*np.sin(theta)
+        cut = np.polyval(impulse[::-1], zi)
+    else:
+        # the impulse is real, rfft pads it and returns only the needed half
+        cut = np.fft.rfft(impulse, n=nfft)[0:nfft//2]
+    gain = abs2_db(cut)
+    phase = 180/np.pi*np.arctan2(cut.imag, cut.real)
+    return f, gain, phase
+
+@functools.lru_cache(maxsize=32)
+def file_gain_and_phase(fname, fmt, mtime, fs):
+    return tuple(readonly(arr) for arr in impulse_gain_and_phase(read_impulse(fname, fmt, mtime), fs))
 
 class Conv(object):
     def __init__(self, conf, fs):
         if not conf:
-            conf = {values: [1.0]}
+            conf = {'values': [1.0]}
+        self.fname = None
         if 'filename' in conf:
-            fname = conf['filename']
-            values = []
+            self.fname = conf['filename']
             if 'format' not in conf:
                 conf['format'] = "text"
-            if conf['format'] == "text":
-                with open(fname) as f:
-                    values = [float(row[0]) for row in csv.reader(f)]
-            elif conf['format'] == "FLOAT64LE":
-                values = np.fromfile(fname, dtype=float)
-            elif conf['format'] == "FLOAT32LE":
-                values = np.fromfile(fname, dtype=np.float32)
-            elif conf['format'] == "S16LE":
-                values = np.fromfile(fname, dtype=np.int16)/(2**15-1)
-            elif conf['format'] == "S24LE":
-                values = np.fromfile(fname, dtype=np.int32)/(2**23-1)
-            elif conf['format'] == "S32LE":
-                values = np.fromfile(fname, dtype=np.int32)/(2**31-1)
+            self.format = conf['format']
+            self.mtime = os.path.getmtime(self.fname)
+            values = read_impulse(self.fname, self.format, self.mtime)
         else:
             values = conf['values']
         self.impulse = values
         self.fs = fs
 
     def gain_and_phase(self):
-        impulselen = len(self.impulse)
-        npoints = impulselen
-        if npoints < 300:
-            npoints = 300
-        impulse = np.zeros(npoints*2)
-        impulse[0:impulselen] = self.impulse
-        impfft = fft.fft(impulse)
-        cut = impfft[0:npoints]
-        f = np.linspace(0, self.fs/2.0, npoints)
-        gain = 20*np.log10(np.abs(cut))
-        phase = 180/np.pi*np.angle(cut)
-        return f, gain, phase
+        # results for coefficient files are cached, a file used by several filters is only analyzed once
+        if self.fname is not None:
+            return file_gain_and_phase(self.fname, self.format, self.mtime, self.fs)
+        return impulse_gain_and_phase(self.impulse, self.fs)
 
     def get_impulse(self):
         t = np.linspace(0, len(self.impulse)/self.fs, len(self.impulse), endpoint=False)
@@ -65,15 +122,13 @@ class DiffEq(object):
             self.b=[1.0]
 
     def gain_and_phase(self, f):
-        z = np.exp(1j*2*np.pi*f/self.fs);
-        A1=np.zeros(z.shape)
-        for n, bn in enumerate(self.b):
-            A1 = A1 + bn*z**(-n)
-        A2=np.zeros(z.shape)
-        for n, an in enumerate(self.a):
-            A2 = A2 + an*z**(-n)  
-        A = A1/A2  
-        gain = 20*np.log10(np.abs(A))
+        theta = 2*np.pi*f/self.fs
+        zi = np.cos(theta) - 1j*np.sin(theta)
+        # polyval wants the highest power first, the coefficients are for z^0, z^-1, ...
+        A1 = np.polyval(self.b[::-1], zi)
+        A2 = np.polyval(self.a[::-1], zi)
+        A = A1/A2
+        gain = abs2_db(A)
         phase = 180/np.pi*np.angle(A)
         return gain, phase
     
@@ -83,7 +138,10 @@ class DiffEq(object):
 
 class BiquadCombo(object):
 
-    def Butterw_q(self, order):
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def Butterw_q(order):
+        # the q values only depend on the order, return a tuple so the cached value can't be modified
         odd = order%2 > 0
         n_so = math.floor(order/2.0)
         qvalues = []
@@ -92,7 +150,7 @@ class BiquadCombo(object):
             qvalues.append(q)
         if odd:
             qvalues.append(-1.0)
-        return qvalues
+        return tuple(qvalues)
 
     def __init__(self, conf, fs):
         self.ftype = conf['type']
@@ -101,7 +159,7 @@ class BiquadCombo(object):
         self.fs = fs
         if self.ftype == "LinkwitzRileyHighpass":
             #qvalues = self.LRtable[self.order]
-            q_temp = self.Butterw_q(self.order/2)
+            q_temp = list(self.Butterw_q(self.order/2))
             if (self.order/2)%2 > 0:
                 q_temp = q_temp[0:-1]
                 qvalues = q_temp + q_temp + [0.5]
@@ -111,7 +169,7 @@ class BiquadCombo(object):
             type_fo = "HighpassFO"
 
         elif self.ftype == "LinkwitzRileyLowpass":
-            q_temp = self.Butterw_q(self.order/2)
+            q_temp = list(self.Butterw_q(self.order/2))
             if (self.order/2)%2 > 0:
                 q_temp = q_temp[0:-1]
                 qvalues = q_temp + q_temp + [0.5]
@@ -120,257 +178,318 @@ class BiquadCombo(object):
             type_so = "Lowpass"
             type_fo = "LowpassFO"
         elif self.ftype == "ButterworthHighpass":
-            qvalues = self.Butterw_q(self.order)
+            qvalues = list(self.Butterw_q(self.order))
             type_so = "Highpass"
             type_fo = "HighpassFO"
         elif self.ftype == "ButterworthLowpass":
-            qvalues = self.Butterw_q(self.order)
+            qvalues = list(self.Butterw_q(self.order))
             type_so = "Lowpass"
             type_fo = "LowpassFO"
-        self.biquads = []
+        biquads = []
         print(qvalues)
         for q in qvalues:
             if q >= 0:
                 bqconf = {'freq': self.freq, 'q': q, 'type': type_so}
             else:
                 bqconf = {'freq': self.freq, 'type': type_fo}
-            self.biquads.append(Biquad(bqconf, self.fs))
+            biquads.append(Biquad(bqconf, self.fs))
+        # only the stacked coefficients of the stages are kept
+        self.coeffs = biquad_coeffs(biquads)
 
     def is_stable(self):
         # TODO
         return None
 
     def gain_and_phase(self, f):
-        A = np.ones(f.shape)
-        for bq in self.biquads:
-            A = A * bq.complex_gain(f)
-        gain = 20*np.log10(np.abs(A))
+        # all stages share the same z^-1 grid, evaluate them in one batch
+        num, den = biquads_num_den(self.coeffs, self.fs, f)
+        A = np.prod(num, axis=0)/np.prod(den, axis=0)
+        gain = abs2_db(A)
         phase = 180/np.pi*np.angle(A)
         return gain, phase
 
+# Biquad coefficient builders, each returns (b0, b1, b2, a0, a1, a2)
+
+@functools.lru_cache(maxsize=None)
+def _trig(freq, fs):
+    # sin and cos of the normalized frequency, shared by all biquads at the same freq
+    omega = 2.0 * math.pi * freq / fs
+    return math.sin(omega), math.cos(omega)
+
+def _free(conf, fs):
+    a0 = 1.0
+    a1 = conf['a1']
+    a2 = conf['a2']
+    b0 = conf['b0']
+    b1 = conf['b1']
+    b2 = conf['b2']
+    return b0, b1, b2, a0, a1, a2
+
+def _highpass(conf, fs):
+    freq = conf['freq']
+    q = conf['q']
+    sn, cs = _trig(freq, fs)
+    alpha = sn / (2.0 * q)
+    b0 = (1.0 + cs) / 2.0
+    b1 = -(1.0 + cs)
+    b2 = (1.0 + cs) / 2.0
+    a0 = 1.0 + alpha
+    a1 = -2.0 * cs
+    a2 = 1.0 - alpha
+    return b0, b1, b2, a0, a1, a2
+
+def _lowpass(conf, fs):
+    freq = conf['freq']
+    q = conf['q']
+    sn, cs = _trig(freq, fs)
+    alpha = sn / (2.0 * q)
+    b0 = (1.0 - cs) / 2.0
+    b1 = 1.0 - cs
+    b2 = (1.0 - cs) / 2.0
+    a0 = 1.0 + alpha
+    a1 = -2.0 * cs
+    a2 = 1.0 - alpha
+    return b0, b1, b2, a0, a1, a2
+
+def _peaking(conf, fs):
+    freq = conf['freq']
+    q = conf['q']
+    gain = conf['gain']
+    sn, cs = _trig(freq, fs)
+    ampl = 10.0**(gain / 40.0)
+    alpha = sn / (2.0 * q)
+    b0 = 1.0 + (alpha * ampl)
+    b1 = -2.0 * cs
+    b2 = 1.0 - (alpha * ampl)
+    a0 = 1.0 + (alpha / ampl)
+    a1 = -2.0 * cs
+    a2 = 1.0 - (alpha / ampl)
+    return b0, b1, b2, a0, a1, a2
+
+def _highshelf_fo(conf, fs):
+    freq = conf['freq']
+    gain = conf['gain']
+    omega = 2.0 * math.pi * freq / fs
+    ampl = 10.0**(gain / 40.0)
+    tn = math.tan(omega/2)
+    b0 = ampl*tn + ampl**2
+    b1 = ampl*tn - ampl**2
+    b2 = 0.0
+    a0 = ampl*tn + 1
+    a1 = ampl*tn - 1
+    a2 = 0.0
+    return b0, b1, b2, a0, a1, a2
+
+def _highshelf(conf, fs):
+    freq = conf['freq']
+    slope = conf['slope']
+    gain = conf['gain']
+    ampl = 10.0**(gain / 40.0)
+    sn, cs = _trig(freq, fs)
+    alpha = sn / 2.0 * math.sqrt((ampl + 1.0 / ampl) * (1.0 / (slope/12.0) - 1.0) + 2.0)
+    beta = 2.0 * math.sqrt(ampl) * alpha
+    b0 = ampl * ((ampl + 1.0) + (ampl - 1.0) * cs + beta)
+    b1 = -2.0 * ampl * ((ampl - 1.0) + (ampl + 1.0) * cs)
+    b2 = ampl * ((ampl + 1.0) + (ampl - 1.0) * cs - beta)
+    a0 = (ampl + 1.0) - (ampl - 1.0) * cs + beta
+    a1 = 2.0 * ((ampl - 1.0) - (ampl + 1.0) * cs)
+    a2 = (ampl + 1.0) - (ampl - 1.0) * cs - beta
+    return b0, b1, b2, a0, a1, a2
+
+def _lowshelf_fo(conf, fs):
+    freq = conf['freq']
+    gain = conf['gain']
+    omega = 2.0 * math.pi * freq / fs
+    ampl = 10.0**(gain / 40.0)
+    tn = math.tan(omega/2)
+    b0 = ampl**2*tn + ampl
+    b1 = ampl**2*tn - ampl
+    b2 = 0.0
+    a0 = tn + ampl
+    a1 = tn - ampl
+    a2 = 0.0
+    return b0, b1, b2, a0, a1, a2
+
+def _lowshelf(conf, fs):
+    freq = conf['freq']
+    slope = conf['slope']
+    gain = conf['gain']
+    ampl = 10.0**(gain / 40.0)
+    sn, cs = _trig(freq, fs)
+    alpha = sn / 2.0 * math.sqrt((ampl + 1.0 / ampl) * (1.0 / (slope/12.0) - 1.0) + 2.0)
+    beta = 2.0 * math.sqrt(ampl) * alpha
+    b0 = ampl * ((ampl + 1.0) - (ampl - 1.0) * cs + beta)
+    b1 = 2.0 * ampl * ((ampl - 1.0) - (ampl + 1.0) * cs)
+    b2 = ampl * ((ampl + 1.0) - (ampl - 1.0) * cs - beta)
+    a0 = (ampl + 1.0) + (ampl - 1.0) * cs + beta
+    a1 = -2.0 * ((ampl - 1.0) + (ampl + 1.0) * cs)
+    a2 = (ampl + 1.0) + (ampl - 1.0) * cs - beta
+    return b0, b1, b2, a0, a1, a2
+
+def _lowpass_fo(conf, fs):
+    freq = conf['freq']
+    omega = 2.0 * math.pi * freq / fs
+    k = math.tan(omega/2.0)
+    alpha = 1 + k
+    a0 = 1.0
+    a1 = -((1 - k)/alpha)
+    a2 = 0.0
+    b0 = k/alpha
+    b1 = k/alpha
+    b2 = 0
+    return b0, b1, b2, a0, a1, a2
+
+def _highpass_fo(conf, fs):
+    freq = conf['freq']
+    omega = 2.0 * math.pi * freq / fs
+    k = math.tan(omega/2.0)
+    alpha = 1 + k
+    a0 = 1.0
+    a1 = -((1 - k)/alpha)
+    a2 = 0.0
+    b0 = 1.0/alpha
+    b1 = -1.0/alpha
+    b2 = 0
+    return b0, b1, b2, a0, a1, a2
+
+def _notch(conf, fs):
+    freq = conf['freq']
+    q = conf['q']
+    sn, cs = _trig(freq, fs)
+    alpha = sn / (2.0 * q)
+    b0 = 1.0
+    b1 = -2.0 * cs
+    b2 = 1.0
+    a0 = 1.0 + alpha
+    a1 = -2.0 * cs
+    a2 = 1.0 - alpha
+    return b0, b1, b2, a0, a1, a2
+
+def _bandpass(conf, fs):
+    freq = conf['freq']
+    q = conf['q']
+    sn, cs = _trig(freq, fs)
+    alpha = sn / (2.0 * q)
+    b0 = alpha
+    b1 = 0.0
+    b2 = -alpha
+    a0 = 1.0 + alpha
+    a1 = -2.0 * cs
+    a2 = 1.0 - alpha
+    return b0, b1, b2, a0, a1, a2
+
+def _allpass(conf, fs):
+    freq = conf['freq']
+    q = conf['q']
+    sn, cs = _trig(freq, fs)
+    alpha = sn / (2.0 * q)
+    b0 = 1.0 - alpha
+    b1 = -2.0 * cs
+    b2 = 1.0 + alpha
+    a0 = 1.0 + alpha
+    a1 = -2.0 * cs
+    a2 = 1.0 - alpha
+    return b0, b1, b2, a0, a1, a2
+
+def _allpass_fo(conf, fs):
+    freq = conf['freq']
+    omega = 2.0 * math.pi * freq / fs
+    tn = math.tan(omega/2.0)
+    alpha = (tn + 1.0)/(tn - 1.0)
+    b0 = 1.0
+    b1 = alpha
+    b2 = 0.0
+    a0 = alpha
+    a1 = 1.0
+    a2 = 0.0
+    return b0, b1, b2, a0, a1, a2
+
+def _linkwitz_transform(conf, fs):
+    f0 = conf['freq_act']
+    q0 = conf['q_act']
+    qt = conf['q_target']
+    ft = conf['freq_target']
+
+    w0 = 2.0 * math.pi * f0
+    wt = 2.0 * math.pi * ft
+    d0i = w0 * w0
+    d1i = w0 / q0
+    c0i = wt * wt
+    c1i = wt / qt
+    wc = math.pi * (ft + f0)
+
+    gn = wc / math.tan(wc / (2.0 * fs))
+    gn2 = gn * gn
+    cci = c0i + gn * c1i + gn2
+
+    b0 = (d0i + gn * d1i + gn2) / cci
+    b1 = 2.0 * (d0i - gn2) / cci
+    b2 = (d0i - gn * d1i + gn2) / cci
+    a0 = 1.0
+    a1 = 2.0 * (c0i - gn2) / cci
+    a2 = (c0i - gn * c1i + gn2) / cci
+    return b0, b1, b2, a0, a1, a2
+
+_COEF_BUILDERS = {
+    "Free": _free,
+    "Highpass": _highpass,
+    "Lowpass": _lowpass,
+    "Peaking": _peaking,
+    "HighshelfFO": _highshelf_fo,
+    "Highshelf": _highshelf,
+    "LowshelfFO": _lowshelf_fo,
+    "Lowshelf": _lowshelf,
+    "LowpassFO": _lowpass_fo,
+    "HighpassFO": _highpass_fo,
+    "Notch": _notch,
+    "Bandpass": _bandpass,
+    "Allpass": _allpass,
+    "AllpassFO": _allpass_fo,
+    "LinkwitzTransform": _linkwitz_transform,
+}
+
 class Biquad(object):
     def __init__(self, conf, fs):
-        ftype = conf['type']
-        if ftype == "Free":
-            a0 = 1.0
-            a1 = conf['a1']
-            a2 = conf['a1']
-            b0 = conf['b0']
-            b1 = conf['b1']
-            b2 = conf['b2']
-        if ftype == "Highpass":
-            freq = conf['freq']
-            q = conf['q']
-            omega = 2.0 * np.pi * freq / fs
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            alpha = sn / (2.0 * q)
-            b0 = (1.0 + cs) / 2.0
-            b1 = -(1.0 + cs)
-            b2 = (1.0 + cs) / 2.0
-            a0 = 1.0 + alpha
-            a1 = -2.0 * cs
-            a2 = 1.0 - alpha
-        elif ftype == "Lowpass":
-            freq = conf['freq']
-            q = conf['q']
-            omega = 2.0 * np.pi * freq / fs
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            alpha = sn / (2.0 * q)
-            b0 = (1.0 - cs) / 2.0
-            b1 = 1.0 - cs
-            b2 = (1.0 - cs) / 2.0
-            a0 = 1.0 + alpha
-            a1 = -2.0 * cs
-            a2 = 1.0 - alpha
-        elif ftype == "Peaking":
-            freq = conf['freq']
-            q = conf['q']
-            gain = conf['gain']
-            omega = 2.0 * np.pi * freq / fs
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            ampl = 10.0**(gain / 40.0)
-            alpha = sn / (2.0 * q)
-            b0 = 1.0 + (alpha * ampl)
-            b1 = -2.0 * cs
-            b2 = 1.0 - (alpha * ampl)
-            a0 = 1.0 + (alpha / ampl)
-            a1 = -2.0 * cs
-            a2 = 1.0 - (alpha / ampl)
-        elif ftype == "HighshelfFO":
-            freq = conf['freq']
-            gain = conf['gain']
-            omega = 2.0 * np.pi * freq / fs
-            ampl = 10.0**(gain / 40.0)
-            tn = np.tan(omega/2)
-            b0 = ampl*tn + ampl**2
-            b1 = ampl*tn - ampl**2
-            b2 = 0.0
-            a0 = ampl*tn + 1
-            a1 = ampl*tn - 1
-            a2 = 0.0
-        elif ftype == "Highshelf":
-            freq = conf['freq']
-            slope = conf['slope']
-            gain = conf['gain']
-            omega = 2.0 * np.pi * freq / fs
-            ampl = 10.0**(gain / 40.0)
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            alpha = sn / 2.0 * np.sqrt((ampl + 1.0 / ampl) * (1.0 / (slope/12.0) - 1.0) + 2.0)
-            beta = 2.0 * np.sqrt(ampl) * alpha
-            b0 = ampl * ((ampl + 1.0) + (ampl - 1.0) * cs + beta)
-            b1 = -2.0 * ampl * ((ampl - 1.0) + (ampl + 1.0) * cs)
-            b2 = ampl * ((ampl + 1.0) + (ampl - 1.0) * cs - beta)
-            a0 = (ampl + 1.0) - (ampl - 1.0) * cs + beta
-            a1 = 2.0 * ((ampl - 1.0) - (ampl + 1.0) * cs)
-            a2 = (ampl + 1.0) - (ampl - 1.0) * cs - beta
-        elif ftype == "LowshelfFO":
-            freq = conf['freq']
-            gain = conf['gain']
-            omega = 2.0 * np.pi * freq / fs
-            ampl = 10.0**(gain / 40.0)
-            tn = np.tan(omega/2)
-            b0 = ampl**2*tn + ampl
-            b1 = ampl**2*tn - ampl
-            b2 = 0.0
-            a0 = tn + ampl
-            a1 = tn - ampl
-            a2 = 0.0
-        elif ftype == "Lowshelf":
-            freq = conf['freq']
-            slope = conf['slope']
-            gain = conf['gain']
-            omega = 2.0 * np.pi * freq / fs
-            ampl = 10.0**(gain / 40.0)
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            alpha = sn / 2.0 * np.sqrt((ampl + 1.0 / ampl) * (1.0 / (slope/12.0) - 1.0) + 2.0)
-            beta = 2.0 * np.sqrt(ampl) * alpha
-            b0 = ampl * ((ampl + 1.0) - (ampl - 1.0) * cs + beta)
-            b1 = 2.0 * ampl * ((ampl - 1.0) - (ampl + 1.0) * cs)
-            b2 = ampl * ((ampl + 1.0) - (ampl - 1.0) * cs - beta)
-            a0 = (ampl + 1.0) + (ampl - 1.0) * cs + beta
-            a1 = -2.0 * ((ampl - 1.0) + (ampl + 1.0) * cs)
-            a2 = (ampl + 1.0) + (ampl - 1.0) * cs - beta
-        elif ftype == "LowpassFO":
-            freq = conf['freq']
-            omega = 2.0 * np.pi * freq / fs
-            k = np.tan(omega/2.0)
-            alpha = 1 + k
-            a0 = 1.0
-            a1 = -((1 - k)/alpha)
-            a2 = 0.0
-            b0 = k/alpha
-            b1 = k/alpha
-            b2 = 0
-        elif ftype == "HighpassFO":
-            freq = conf['freq']
-            omega = 2.0 * np.pi * freq / fs
-            k = np.tan(omega/2.0)
-            alpha = 1 + k
-            a0 = 1.0
-            a1 = -((1 - k)/alpha)
-            a2 = 0.0
-            b0 = 1.0/alpha
-            b1 = -1.0/alpha
-            b2 = 0
-        elif ftype == "Notch":
-            freq = conf['freq']
-            q = conf['q']
-            omega = 2.0 * np.pi * freq / fs
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            alpha = sn / (2.0 * q)
-            b0 = 1.0
-            b1 = -2.0 * cs
-            b2 = 1.0
-            a0 = 1.0 + alpha
-            a1 = -2.0 * cs
-            a2 = 1.0 - alpha
-        elif ftype == "Bandpass":
-            freq = conf['freq']
-            q = conf['q']
-            omega = 2.0 * np.pi * freq / fs
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            alpha = sn / (2.0 * q)
-            b0 = alpha
-            b1 = 0.0
-            b2 = -alpha
-            a0 = 1.0 + alpha
-            a1 = -2.0 * cs
-            a2 = 1.0 - alpha
-        elif ftype == "Allpass":
-            freq = conf['freq']
-            q = conf['q']
-            omega = 2.0 * np.pi * freq / fs
-            sn = np.sin(omega)
-            cs = np.cos(omega)
-            alpha = sn / (2.0 * q)
-            b0 = 1.0 - alpha
-            b1 = -2.0 * cs
-            b2 = 1.0 + alpha
-            a0 = 1.0 + alpha
-            a1 = -2.0 * cs
-            a2 = 1.0 - alpha
-        elif ftype == "AllpassFO":
-            freq = conf['freq']
-            omega = 2.0 * np.pi * freq / fs
-            tn = np.tan(omega/2.0)
-            alpha = (tn + 1.0)/(tn - 1.0)
-            b0 = 1.0
-            b1 = alpha
-            b2 = 0.0
-            a0 = alpha
-            a1 = 1.0
-            a2 = 0.0
-        elif ftype == "LinkwitzTransform":
-            f0 = conf['freq_act']
-            q0 = conf['q_act']
-            qt = conf['q_target']
-            ft = conf['freq_target']
-
-            d0i = (2.0 * np.pi * f0)**2
-            d1i = (2.0 * np.pi * f0)/q0
-            c0i = (2.0 * np.pi * ft)**2
-            c1i = (2.0 * np.pi * ft)/qt
-            fc = (ft+f0)/2.0
-
-            gn = 2 * np.pi * fc/math.tan(np.pi*fc/fs)
-            cci = c0i + gn * c1i + gn**2
-
-            b0 = (d0i+gn*d1i + gn**2)/cci 
-            b1 = 2*(d0i-gn**2)/cci
-            b2 = (d0i - gn*d1i + gn**2)/cci
-            a0 = 1.0
-            a1 = 2.0 * (c0i-gn**2)/cci
-            a2 = ((c0i-gn*c1i + gn**2)/cci)
-
-
+        b0, b1, b2, a0, a1, a2 = _COEF_BUILDERS[conf['type']](conf, fs)
         self.fs = fs
         self.a1 = a1 / a0
         self.a2 = a2 / a0
         self.b0 = b0 / a0
         self.b1 = b1 / a0
         self.b2 = b2 / a0
-        
+        self.coeffs = biquad_coeffs([self])
+
     def complex_gain(self, f):
-        z = np.exp(1j*2*np.pi*f/self.fs);
-        A = (self.b0 + self.b1*z**(-1) + self.b2*z**(-2))/(1.0 + self.a1*z**(-1) + self.a2*z**(-2))
-        return A
+        num, den = biquads_num_den(self.coeffs, self.fs, f)
+        return num[0]/den[0]
 
     def gain_and_phase(self, f):
-        A = self.complex_gain(f)
-        gain = 20*np.log10(np.abs(A))
-        phase = 180/np.pi*np.angle(A)
-        return gain, phase
+        gain, phase = biquads_gain_and_phase(self.coeffs, self.fs, f)
+        return gain[0], phase[0]
 
     def is_stable(self):
         return abs(self.a2)<1.0 and abs(self.a1) < (self.a2+1.0)
-        
+
+def biquad_coeffs(biquads):
+    # stack the normalized coefficients of several biquads, one row of b0, b1, b2, a1, a2 per biquad
+    return np.array([(bq.b0, bq.b1, bq.b2, bq.a1, bq.a2) for bq in biquads], dtype=np.float64)
+
+def biquads_num_den(coeffs, fs, f):
+    # evaluate numerators and denominators of several biquads at once,
+    # in Horner form in z^-1, giving one row per biquad
+    b0, b1, b2, a1, a2 = coeffs.T[:, :, None]
+    theta = 2*np.pi*f/fs
+    zi = np.cos(theta) - 1j*np.sin(theta)
+    num = (b2*zi + b1)*zi + b0
+    den = (a2*zi + a1)*zi + 1.0
+    return num, den
+
+def biquads_gain_and_phase(coeffs, fs, f):
+    num, den = biquads_num_den(coeffs, fs, f)
+    gain = abs2_db(num) - abs2_db(den)
+    phase = 180/np.pi*np.angle(num*np.conj(den))
+    return gain, phase
+
 class Block(object):
     def __init__(self, label):
         self.label = label
@@ -381,9 +500,9 @@ class Block(object):
         self.x = x
         self.y = y
 
-    def draw(self, ax):
-        rect = Rectangle((self.x-0.5, self.y-0.25), 1.0, 0.5, linewidth=1,edgecolor='r',facecolor='none')
-        ax.add_patch(rect)
+    def draw(self, ax, patches):
+        rect = Rectangle((self.x-0.5, self.y-0.25), 1.0, 0.5)
+        patches['blocks'].append(rect)
         ax.text(self.x, self.y, self.label, horizontalalignment='center', verticalalignment='center')
 
 
@@ -393,10 +512,11 @@ class Block(object):
     def output_point(self):
         return self.x+0.5, self.y
 
-def draw_arrow(ax, p0, p1, label=None):
+def draw_arrow(ax, patches, p0, p1, label=None):
     x0, y0 = p0
     x1, y1 = p1
-    ax.arrow(x0, y0, x1-x0, y1-y0, width=0.01, length_includes_head=True, head_width=0.1)
+    arrow = FancyArrow(x0, y0, x1-x0, y1-y0, width=0.01, length_includes_head=True, head_width=0.1)
+    patches['arrows'].append(arrow)
     if y1 > y0:
         hal = 'right'
         val = 'bottom'
@@ -406,21 +526,26 @@ def draw_arrow(ax, p0, p1, label=None):
     if label is not None:
         ax.text(x0+(x1-x0)*2/3, y0+(y1-y0)*2/3, label, horizontalalignment=hal, verticalalignment=val)
 
-def draw_box(ax, level, size, label=None):
+def draw_box(ax, patches, level, size, label=None):
     x0 = 2*level-0.75
     y0 = -size/2
-    rect = Rectangle((x0, y0), 1.5, size, linewidth=1,edgecolor='g',facecolor='none', linestyle='--')
-    ax.add_patch(rect)
+    rect = Rectangle((x0, y0), 1.5, size)
+    patches['boxes'].append(rect)
     if label is not None:
         ax.text(2*level, size/2, label, horizontalalignment='center', verticalalignment='bottom')
 
+def add_patches(ax, patches):
+    # add all shapes of each kind to the axes as a single collection
+    ax.add_collection(PatchCollection(patches['blocks'], linewidth=1, edgecolor='r', facecolor='none'))
+    ax.add_collection(PatchCollection(patches['boxes'], linewidth=1, edgecolor='g', facecolor='none', linestyle='--'))
+    ax.add_collection(PatchCollection(patches['arrows'], linewidth=1, edgecolor='k', facecolor='C0'))
+
 def main():
     print('This script is deprecated. Please use the "plotcamillaconf" tool\nfrom the pycamilladsp-plot library instead.')
     fname = sys.argv[1]
 
-    conffile = open(fname)
-
-    conf = yaml.safe_load(conffile)
+    with open(fname) as conffile:
+        conf = yaml.load(conffile, Loader=SafeLoader)
     print(conf)
 
     srate = conf['devices']['samplerate']
@@ -433,16 +558,26 @@ def main():
 
     if 'filters' in conf:
         fvect = np.linspace(1, (srate*0.95)/2.0, 10000)
+        # evaluate all plain biquads together in a single batch
+        biquads = {}
+        for filter, fconf in conf['filters'].items():
+            if fconf['type'] == 'Biquad':
+                biquads[filter] = Biquad(fconf['parameters'], srate)
+        if biquads:
+            bq_magn, bq_phase = biquads_gain_and_phase(biquad_coeffs(biquads.values()), srate, fvect)
+            bq_responses = dict(zip(biquads, zip(bq_magn, bq_phase)))
         for filter, fconf in conf['filters'].items():
             if fconf['type'] in ('Biquad', 'DiffEq', 'BiquadCombo'):
                 if fconf['type'] == 'DiffEq':
                     kladd = DiffEq(fconf['parameters'], srate)
+                    magn, phase = kladd.gain_and_phase(fvect)
                 elif fconf['type'] == 'BiquadCombo':
                     kladd = BiquadCombo(fconf['parameters'], srate)
+                    magn, phase = kladd.gain_and_phase(fvect)
                 else:
-                    kladd = Biquad(fconf['parameters'], srate)
+                    kladd = biquads[filter]
+                    magn, phase = bq_responses[filter]
                 plt.figure(num=filter)
-                magn, phase = kladd.gain_and_phase(fvect)
                 stable = kladd.is_stable()
                 plt.subplot(2,1,1)
                 plt.semilogx(fvect, magn)
@@ -474,6 +609,7 @@ def main():
     fig = plt.figure(fignbr)
     
     ax = fig.add_subplot(111, aspect='equal')
+    patches = {'blocks': [], 'boxes': [], 'arrows': []}
     # add input
     channels = []
     active_channels = int(conf['devices']['capture']['channels'])
@@ -481,13 +617,13 @@ def main():
         label = "ch {}".format(n) 
         b = Block(label)
         b.place(0, -active_channels/2 + 0.5 + n)
-        b.draw(ax)
+        b.draw(ax, patches)
         channels.append([b])
     if 'device' in conf['devices']['capture']:
         capturename = conf['devices']['capture']['device']
     else:
         capturename = conf['devices']['capture']['filename']
-    draw_box(ax, 0, active_channels, label=capturename)
+    draw_box(ax, patches, 0, active_channels, label=capturename)
     stages.append(channels)
 
     # loop through pipeline
@@ -502,13 +638,13 @@ def main():
                 name = step['name']
                 mixconf = conf['mixers'][name]
                 active_channels = int(mixconf['channels']['out'])
-                channels = [[]]*active_channels
+                channels = []
                 for n in range(active_channels):
                     label = "ch {}".format(n)
                     b = Block(label)
                     b.place(total_length*2, -active_channels/2 + 0.5 + n)
-                    b.draw(ax)
-                    channels[n] = [b]
+                    b.draw(ax, patches)
+                    channels.append([b])
                 for mapping in mixconf['mapping']:
                     dest_ch = int(mapping['dest'])
                     for src in mapping['sources']:
@@ -518,8 +654,8 @@ def main():
                             label = label + '\ninv.'
                         src_p = stages[-1][src_ch][-1].output_point()
                         dest_p = channels[dest_ch][0].input_point()
-                        draw_arrow(ax, src_p, dest_p, label=label)
-                draw_box(ax, total_length, active_channels, label=name)
+                        draw_arrow(ax, patches, src_p, dest_p, label=label)
+                draw_box(ax, patches, total_length, active_channels, label=name)
                 stages.append(channels)
                 stage_start = total_length
             elif step['type'] == 'Filter':
@@ -529,10 +665,10 @@ def main():
                     ch_step = stage_start + len(stages[-1][ch_nbr])
                     total_length = max((total_length, ch_step))
                     b.place(ch_step*2, -active_channels/2 + 0.5 + ch_nbr)
-                    b.draw(ax)
+                    b.draw(ax, patches)
                     src_p = stages[-1][ch_nbr][-1].output_point()
                     dest_p = b.input_point()
-                    draw_arrow(ax, src_p, dest_p)
+                    draw_arrow(ax, patches, src_p, dest_p)
                     stages[-1][ch_nbr].append(b)
 
 
@@ -542,17 +678,18 @@ def main():
         label = "ch {}".format(n) 
         b = Block(label)
         b.place(2*total_length, -active_channels/2 + 0.5 + n)
-        b.draw(ax)
+        b.draw(ax, patches)
         src_p = stages[-1][n][-1].output_point()
         dest_p = b.input_point()
-        draw_arrow(ax, src_p, dest_p)
+        draw_arrow(ax, patches, src_p, dest_p)
         channels.append([b])
     if 'device' in conf['devices']['playback']:
         playname = conf['devices']['playback']['device']
     else:
         playname = conf['devices']['playback']['filename']
-    draw_box(ax, total_length, active_channels, label=playname)
+    draw_box(ax, patches, total_length, active_channels, label=playname)
     stages.append(channels)
+    add_patches(ax, patches)
     
     nbr_chan = [len(s) for s in stages]
     ylim = math.ceil(max(nbr_chan)/2.0) + 0.5
@@ -1,84 +1,117 @@
 import os
+import functools
+import mmap
 import struct
 import logging
 
+logger = logging.getLogger(__name__)
+
 sampleformats = {1: "int",
     3: "float",
     }
 
+# fmt chunk: format tag, channels, sample rate, byte rate, bytes per frame, bits per sample
+_FMT_STRUCT = struct.Struct('<HHLLHH')
+# chunk header: type and length
+_CHUNK_HDR = struct.Struct('<4sL')
+
+# (sample type, bits per sample, bytes per sample) -> CamillaDSP sample format
+_SFMT_TABLE = {
+    ("int", 16, 2): "S16LE",
+    ("int", 24, 3): "S24LE3",
+    ("int", 24, 4): "S24LE",
+    ("int", 32, 4): "S32LE",
+    ("float", 32, 4): "FLOAT32LE",
+    ("float", 64, 8): "FLOAT64LE",
+    }
+
+def _parse_fmt(start, length, file, wav_info):
+    data = file.read(length)
+    fmt, nchannels, samplerate, byterate, bytesperframe, bitspersample = _FMT_STRUCT.unpack_from(data)
+    bytes_per_sample = bytesperframe//nchannels
+    key = (sampleformats.get(fmt), bitspersample, bytes_per_sample)
+    wav_info['SampleFormat'] = _SFMT_TABLE.get(key, "unknown")
+    wav_info['NumChannels'] = nchannels
+    wav_info['SampleRate'] = samplerate
+    wav_info['ByteRate'] = byterate
+    wav_info['BytesPerFrame'] = bytesperframe
+    wav_info['BitsPerSample'] = bitspersample
+
+def _parse_data(start, length, file, wav_info):
+    wav_info['DataStart'] = start
+    wav_info['DataLength'] = length
+
+_HANDLERS = {"fmt ": _parse_fmt,
+    "data": _parse_data,
+    }
+
 def analyze_chunk(type, start, length, file, wav_info):
-    if type == "fmt ":
-        data = file.read(length)
-        wav_info['SampleFormat'] = sampleformats[struct.unpack('<H', data[0:2])[0]]
-        wav_info['NumChannels'] = struct.unpack('<H', data[2:4])[0]
-        wav_info['SampleRate'] = struct.unpack('<L', data[4:8])[0]
-        wav_info['ByteRate'] = struct.unpack('<L', data[8:12])[0]
-        wav_info['BytesPerFrame'] = struct.unpack('<H', data[12:14])[0]
-        wav_info['BitsPerSample'] = struct.unpack('<H', data[14:16])[0]
-        bytes_per_sample = wav_info['BytesPerFrame']/wav_info['NumChannels']
-        if wav_info['SampleFormat'] == "int":
-            if wav_info['BitsPerSample'] == 16:
-                sfmt = "S16LE"
-            elif wav_info['BitsPerSample'] == 24 and bytes_per_sample == 3:
-                sfmt = "S24LE3"
-            elif wav_info['BitsPerSample'] == 24 and bytes_per_sample == 4:
-                sfmt = "S24LE"
-            elif wav_info['BitsPerSample'] == 32:
-                sfmt = "S32LE"
-        elif wav_info['SampleFormat'] == "float":
-            if wav_info['BitsPerSample'] == 32:
-                sfmt = "FLOAT32LE"
-            elif wav_info['BitsPerSample'] == 64:
-                sfmt = "FLOAT64LE"
-        else:
-            sfmt = "unknown"
-        wav_info['SampleFormat'] = sfmt
-    elif type == "data":
-        wav_info['DataStart'] = start
-        wav_info['DataLength'] = length
-    
+    handler = _HANDLERS.get(type)
+    if handler is not None:
+        handler(start, length, file, wav_info)
 
 def read_wav_header(filename):
     """ 
     Reads the wav header to extract sample format, number of channels, and location of the audio data in the file
     """
-    logging.basicConfig(level=logging.DEBUG)
+    # Parsed headers are cached, the modification time and size make sure a changed file gets parsed again
     try:
-        file_in = open(filename, 'rb')
-    except IOError as err:
-        logging.debug("Could not open input file %s" % (strWAVFile))
+        stat = os.stat(filename)
+        wav_info = _read_wav_header_cached(os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+    except OSError as err:
+        logger.debug("Could not open input file %s: %s", filename, err)
+        return
+    except ValueError as err:
+        logger.debug("Input file is not a standard WAV file: %s", err)
         return
+    # return a copy so that callers can't modify the cached header
+    return dict(wav_info)
 
-    # Read fixed header
-    buf_header = file_in.read(12)
-    # Verify that the correct identifiers are present
+# Failures raise instead of returning None, exceptions are not cached so a file
+# that could not be read, for example because of its permissions, is tried again next time
+@functools.lru_cache(maxsize=128)
+def _read_wav_header_cached(filename, mtime_ns, size):
+    with open(filename, 'rb') as file_in:
+        if size == 0:
+            raise ValueError("empty file")
+        # Map the file instead of reading it, only the pages that are accessed get loaded
+        try:
+            wav_map = mmap.mmap(file_in.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Files that don't fit in the address space, for example over 2 GiB on 32-bit systems,
+            # can't be mapped. Read them with seek and read instead.
+            return _scan_chunks(file_in, size)
+        with wav_map:
+            return _scan_chunks(wav_map, size)
+
+def _scan_chunks(src, size):
+    # src is the open file or a map of it, both support seek and read
+    # Verify that the correct identifiers are present in the fixed header
+    src.seek(0)
+    buf_header = src.read(12)
     if (buf_header[0:4] != b"RIFF") or \
-       (buf_header[8:12] != b"WAVE"): 
-         logging.debug("Input file is not a standard WAV file")
-         return
+       (buf_header[8:12] != b"WAVE"):
+         raise ValueError("missing RIFF/WAVE identifiers")
 
     wav_info = {}
 
-    # Get file length
-    file_in.seek(0, 2) # Seek to end of file
-    input_filesize = file_in.tell()
-
     next_chunk_location = 12 # skip the fixed header
-    while True:
-        file_in.seek(next_chunk_location)
-        buf_header = file_in.read(8)
-        chunk_type = buf_header[0:4].decode("utf-8")
-        chunk_length = struct.unpack('<L', buf_header[4:8])[0]
-        logging.debug("Found chunk of type {}, length {}".format(chunk_type, chunk_length))
-        analyze_chunk(chunk_type, next_chunk_location, chunk_length, file_in, wav_info)
-        next_chunk_location += (8 + chunk_length) 
-        if next_chunk_location >= input_filesize:
+    # Only the fmt and data chunks are needed, stop as soon as both have been found
+    while 'SampleFormat' not in wav_info or 'DataStart' not in wav_info:
+        if next_chunk_location + 8 > size:
+            # reached the end of the file
             break
-    file_in.close()
+        src.seek(next_chunk_location)
+        chunk_type, chunk_length = _CHUNK_HDR.unpack(src.read(8))
+        chunk_type = chunk_type.decode("utf-8")
+        logger.debug("Found chunk of type %s, length %d", chunk_type, chunk_length)
+        analyze_chunk(chunk_type, next_chunk_location, chunk_length, src, wav_info)
+        next_chunk_location += (8 + chunk_length)
     return wav_info
  
 if __name__ == "__main__":
     import sys
+    logging.basicConfig(level=logging.DEBUG)
     info = read_wav_header(sys.argv[1])
     print("Wav properties:")
     for name, val in info.items():
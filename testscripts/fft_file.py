@@ -7,7 +7,6 @@ import yaml
 import sys
 from matplotlib import pyplot as plt
 from matplotlib.patches import Rectangle
-import math
 
 fname = sys.argv[1]
 datafmt = sys.argv[2]
@@ -18,38 +17,58 @@ try:
 except:
     window = 0
 
+def int_to_float(raw, bits):
+    # float64, since float32 can't hold 32-bit samples and would limit the noise floor of the fft
+    return np.multiply(raw, 1.0/(2**(bits-1)-1), dtype=np.float64)
+
+bits = None
 if datafmt == "text":
     with open(fname) as f:
-        values = [float(row[0]) for row in csv.reader(f)]
-elif datafmt == "FLOAT64LE":
-    values = np.fromfile(fname, dtype=float)
-elif datafmt == "FLOAT32LE":
-    values = np.fromfile(fname, dtype=np.float32)
-elif datafmt == "S16LE":
-    values = np.fromfile(fname, dtype=np.int16)/(2**15-1)
-elif datafmt == "S24LE":
-    values = np.fromfile(fname, dtype=np.int32)/(2**23-1)
-elif datafmt == "S32LE":
-    values = np.fromfile(fname, dtype=np.int32)/(2**31-1)
-elif datafmt == "S64LE":
-    values = np.fromfile(fname, dtype=np.int64)/(2**31-1)
+        values = np.array([float(row[0]) for row in csv.reader(f)])
+else:
+    if datafmt == "FLOAT64LE":
+        dtype = float
+    elif datafmt == "FLOAT32LE":
+        dtype = np.float32
+    elif datafmt == "S16LE":
+        dtype, bits = np.int16, 16
+    elif datafmt == "S24LE":
+        dtype, bits = np.int32, 24
+    elif datafmt == "S32LE":
+        dtype, bits = np.int32, 32
+    elif datafmt == "S64LE":
+        dtype, bits = np.int64, 32
+    # map the file instead of reading it, samples are only loaded one channel at a time
+    values = np.memmap(fname, dtype=dtype, mode='r')
+
+# interleaved samples, one column per channel. This is a view, nothing is copied
+all_values = np.reshape(values, (-1, nchannels))
 
-all_values = np.reshape(values, (nchannels, -1), order='F')
+def channel_values(chan):
+    raw = all_values[:,chan]
+    if bits is None:
+        # float32 data is upcast too, so that the fft is done in double precision
+        return np.asarray(raw, dtype=np.float64)
+    if bits == 24:
+        # 24 bits in the lower three bytes of each 4-byte word, shift up and down to sign extend
+        raw = (raw << 8) >> 8
+    return int_to_float(raw, bits)
 
 plt.figure(num="FFT of {}".format(fname))
 for chan in range(nchannels):
-    chanvals = all_values[chan,:]
+    chanvals = channel_values(chan)
     npoints = len(chanvals)
     if window>0:
         #chanvals = chanvals[1024:700000]
         npoints = len(chanvals)
-        for n in range(window):
-            chanvals = chanvals*np.blackman(npoints)
+        # applying the window n times is the same as applying it once raised to the power of n
+        w = np.blackman(npoints)**window
+        chanvals = chanvals*w
     print(npoints)
     t = np.linspace(0, npoints/srate, npoints, endpoint=False) 
-    f = np.linspace(0, srate/2.0, math.floor(npoints/2))
-    valfft = fft.fft(chanvals)
-    cut = valfft[0:math.floor(npoints/2)]
+    # real input, so only the non-negative frequencies need to be computed
+    f = fft.rfftfreq(npoints, 1.0/srate)[0:npoints//2]
+    cut = fft.rfft(chanvals)[0:npoints//2]
     gain = 20*np.log10(np.abs(cut))
     if window:
         gain = gain-np.max(gain)
@@ -1,21 +1,22 @@
 # Make short FIR coeffs in different formats, for testing importing 
 import numpy as np
 
-start = np.linspace(0, 1, 16)
-mid  = np.linspace(1,-1, 32)
-end = np.linspace(-1, 0, 16)
-impulse = np.concatenate((start,mid,end))
-float64 = np.array(impulse, dtype="float64")
-float32 = np.array(impulse, dtype="float32")
-int16 = np.array((2**15-1)*impulse, dtype="int16")
-int24 = np.array((2**23-1)*impulse, dtype="int32")
-int32 = np.array((2**31-1)*impulse, dtype="int32")
+def write_scaled(values, scale, dtype, fname):
+    # scale and truncate straight into a buffer of the target type
+    buf = np.empty(len(values), dtype=dtype)
+    np.multiply(values, scale, out=buf, casting="unsafe")
+    buf.tofile(fname)
 
-float64.tofile("float64.raw")
-float32.tofile("float32.raw")
-int16.tofile("int16.raw")
-int24.tofile("int24.raw")
-int32.tofile("int32.raw")
+impulse = np.empty(64)
+impulse[0:16] = np.linspace(0, 1, 16)
+impulse[16:48] = np.linspace(1, -1, 32)
+impulse[48:64] = np.linspace(-1, 0, 16)
+
+impulse.tofile("float64.raw")
+impulse.astype("float32").tofile("float32.raw")
+write_scaled(impulse, 2**15-1, "int16", "int16.raw")
+write_scaled(impulse, 2**23-1, "int32", "int24.raw")
+write_scaled(impulse, 2**31-1, "int32", "int32.raw")
 
 
 float64 = np.array([-1.0, -0.5, 0.0, 0.5, 1.0], dtype="float64")
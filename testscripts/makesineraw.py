@@ -1,18 +1,19 @@
 # Make a simple sine for testing purposes
+# Any extra frequencies given after the length are added to the first one,
+# the amplitude is shared between them so the sum never exceeds 0.5
 import numpy as np
 import sys
 f = float(sys.argv[2])
 fs = float(sys.argv[1])
 length = int(sys.argv[3])
-t = np.linspace(0, 20, num=int(20*fs), endpoint=False)
-wave = 0.5*np.sin(f*2*np.pi*t)
-wave= np.reshape(wave,(-1,1))
-wave = np.concatenate((wave, wave), axis=1)
+freqs = np.array([f] + [float(x) for x in sys.argv[4:]])
+t = np.linspace(0, length, num=int(length*fs), endpoint=False)
+# one column per frequency, sin is done in place and the columns summed
+phases = np.multiply.outer(t, 2*np.pi*freqs)
+wave = 0.5/len(freqs)*np.sin(phases, out=phases).sum(axis=1)
+wave64 = np.ascontiguousarray(np.broadcast_to(wave[:,None], (len(wave), 2)), dtype='float64')
 
-wave64 = wave.astype('float64')
-
-name = "sine_{:.0f}_{:.0f}_{}s_f64_2ch.raw".format(f, fs, length)
+freqnames = "+".join("{:.0f}".format(freq) for freq in freqs)
+name = "sine_{}_{:.0f}_{}s_f64_2ch.raw".format(freqnames, fs, length)
 #print(wave64)
 wave64.tofile(name)
-
-
@@ -1,5 +1,9 @@
 #play wav
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 from websocket import create_connection
 import sys
 import os
@@ -18,7 +22,12 @@ except:
     sys.exit()
 # read the config to a Python dict
 with open(template_file) as f:
-    cfg=yaml.safe_load(f)
+    text = f.read()
+# json is a subset of yaml, and much faster to parse when the template happens to be json
+try:
+    cfg = json.loads(text)
+except ValueError:
+    cfg = yaml.load(text, Loader=SafeLoader)
 
 wav_info = read_wav_header(wav_file)
 if wav_info["SampleFormat"] == "unknown":
@@ -44,9 +53,9 @@ else:
 cfg["devices"]["capture"] = capt_device
 
 # Serialize to yaml string
-modded = yaml.dump(cfg)
+modded = yaml.dump(cfg, Dumper=SafeDumper, default_flow_style=False)
 
 # Send the modded config
 ws = create_connection("ws://127.0.0.1:{}".format(port))
-ws.send(json.dumps({"SetConfig": modded))
+ws.send(json.dumps({"SetConfig": modded}))
 ws.recv()
\ No newline at end of file